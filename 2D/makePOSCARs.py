@@ -1,9 +1,32 @@
 import json
 import os
+import re
 import argparse
-from pymatgen.core import Structure
-import glob
+import logging
+import multiprocessing
+import importlib.util
+import io
+import tarfile
+import time
+import itertools
+from contextlib import contextmanager
+from functools import lru_cache, partial
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Optional faster JSON backends
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional zstd compression for --archive zst
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def parse_arguments():
     """
@@ -36,11 +59,45 @@ def parse_arguments():
         default="POSCAR_",
         help="Prefix for the POSCAR filenames. Defaults to 'POSCAR_'.",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--validate",
+        "--safe",
+        dest="validate",
+        action="store_true",
+        help="Reconstruct and validate each Structure with pymatgen and use its POSCAR writer instead of the fast formatter.",
+    )
+    parser.add_argument(
+        "--archive",
+        choices=sorted(_ARCHIVE_FORMATS),
+        default=None,
+        help="Bundle the POSCAR files into sharded tar archives (uncompressed, gzip or zstd) instead of writing one file per structure.",
+    )
+    parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=10000,
+        help="Number of POSCAR files per archive when --archive is used. Defaults to 10000.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Log per-entry progress and skipped entries.",
+    )
     return parser.parse_args()
 
 def load_json(file_path):
     """
-    Loads JSON data from a file.
+    Loads JSON data from a file. orjson is used when available; it rejects
+    the NaN/Infinity literals that json.dump writes by default, so files it
+    cannot parse are reparsed with the json module.
 
     Args:
         file_path (str): Path to the JSON file.
@@ -49,14 +106,41 @@ def load_json(file_path):
         dict: Parsed JSON data.
     """
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        print(f"Successfully loaded JSON data from '{file_path}'.")
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        if orjson is not None:
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                data = json.loads(raw)
+        else:
+            data = json.loads(raw)
+        logger.info("Successfully loaded JSON data from '%s'.", file_path)
         return data
     except Exception as e:
-        print(f"Error loading JSON file '{file_path}': {e}")
+        logger.error("Error loading JSON file '%s': %s", file_path, e)
         return None  # Return None instead of exiting
 
+def list_json_files(directory):
+    """
+    Lists the JSON files in a directory, sorted by path. Uses os.scandir so
+    names come straight from the directory listing, without glob matching.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        list: Paths of the JSON files, or an empty list if the directory does not exist.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return sorted(
+                entry.path for entry in it
+                if entry.name.endswith(".json") and not entry.name.startswith(".")
+            )
+    except FileNotFoundError:
+        return []
+
 def create_output_directory(directory):
     """
     Creates the output directory if it does not exist.
@@ -67,27 +151,178 @@ def create_output_directory(directory):
     if not os.path.exists(directory):
         try:
             os.makedirs(directory)
-            print(f"Created output directory '{directory}'.")
+            logger.info("Created output directory '%s'.", directory)
         except Exception as e:
-            print(f"Error creating directory '{directory}': {e}")
+            logger.error("Error creating directory '%s': %s", directory, e)
             sys.exit(1)
     else:
-        print(f"Output directory '{directory}' already exists.")
+        logger.info("Output directory '%s' already exists.", directory)
 
-def generate_poscar(structure, filename):
+def write_poscar(filename, text):
     """
-    Generates a POSCAR file from a pymatgen Structure object.
+    Writes POSCAR text to a file with a single buffered write.
 
     Args:
-        structure (Structure): pymatgen Structure object.
         filename (str): Path to save the POSCAR file.
+        text (str): POSCAR file contents.
     """
     try:
-        structure.to(fmt="poscar", filename=filename)
-        print(f"POSCAR file written to '{filename}'.")
+        with open(filename, "wb", buffering=1 << 20) as f:
+            f.write(text.encode())
     except Exception as e:
-        print(f"Error writing POSCAR file '{filename}': {e}")
+        logger.error("Error writing POSCAR file '%s': %s", filename, e)
+
+# Archive formats for --archive: tarfile mode and file suffix
+_ARCHIVE_FORMATS = {
+    "tar": ("w", ".tar"),
+    "gz": ("w:gz", ".tar.gz"),
+    "zst": ("w|", ".tar.zst"),
+}
+
+class PoscarArchive:
+    """
+    Writes POSCAR files as members of sharded tar archives instead of one
+    file per structure. Shards are named poscars_shardNNN.tar[.gz|.zst] and
+    hold up to shard_size members each. The member names are the POSCAR
+    filenames that id_prop.csv refers to.
+    """
+
+    def __init__(self, output_dir, compression, shard_size=10000):
+        self.output_dir = output_dir
+        self.compression = compression
+        self.shard_size = shard_size
+        self.shard_index = 0
+        self.count = 0
+        self.tar = None
+        self.stream = None
+
+    def _open_shard(self):
+        mode, suffix = _ARCHIVE_FORMATS[self.compression]
+        path = os.path.join(self.output_dir, f"poscars_shard{self.shard_index:03d}{suffix}")
+        if self.compression == "zst":
+            self.stream = zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+            self.tar = tarfile.open(fileobj=self.stream, mode=mode)
+        else:
+            self.tar = tarfile.open(path, mode=mode)
+        logger.info("Writing POSCAR archive '%s'.", path)
+
+    def _close_shard(self):
+        self.tar.close()
+        if self.stream is not None:
+            # Ends the zstd frame and closes the underlying file
+            self.stream.close()
+        self.tar = None
+        self.stream = None
+        self.count = 0
+        self.shard_index += 1
+
+    def write(self, filename, text):
+        """
+        Adds POSCAR text to the current shard, starting a new one when full.
+
+        Args:
+            filename (str): Path of the POSCAR file; its basename is the member name.
+            text (str): POSCAR file contents.
+        """
+        if self.tar is None:
+            self._open_shard()
+
+        data = text.encode()
+        info = tarfile.TarInfo(name=os.path.basename(filename))
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.tar.addfile(info, io.BytesIO(data))
+
+        self.count += 1
+        if self.count >= self.shard_size:
+            self._close_shard()
+
+    def close(self):
+        """Finishes the current shard, if any."""
+        if self.tar is not None:
+            self._close_shard()
+
+@contextmanager
+def open_poscar_writer(output_dir, archive=None, shard_size=10000):
+    """
+    Context manager yielding a write(filename, text) callable: write_poscar
+    for plain files, or PoscarArchive.write when writing archives.
+
+    Args:
+        output_dir (str): Directory to save the POSCAR files or archives.
+        archive (str): One of the _ARCHIVE_FORMATS keys, or None for plain files.
+        shard_size (int): Number of POSCAR files per archive.
+    """
+    if archive is None:
+        yield write_poscar
+        return
+
+    poscar_archive = PoscarArchive(output_dir, archive, shard_size)
+    try:
+        yield poscar_archive.write
+    finally:
+        poscar_archive.close()
+
+# Number format pymatgen's POSCAR writer uses for lattice and coordinate rows
+_POSCAR_ROW = "{:21.16f} {:21.16f} {:21.16f}"
+
+# Site properties that pymatgen writes into a POSCAR; the fast formatter
+# cannot emit them, so structures carrying them are rejected
+_POSCAR_SITE_PROPERTIES = ("selective_dynamics", "velocities", "predictor_corrector")
+
+def _poscar_from_dict(structure_dict):
+    """
+    Formats POSCAR text straight from a serialized pymatgen Structure,
+    without building the Structure object. Sites are written in direct
+    (fractional) coordinates with pymatgen's number format; if any site
+    lacks fractional coordinates, Cartesian ones are written instead.
+
+    The output is not identical to pymatgen's: the comment line lists the
+    species blocks in site order rather than the reduced formula, and site
+    labels are bare element symbols without oxidation states. Structures
+    with selective dynamics, velocities or predictor-corrector site
+    properties raise ValueError; use --validate for those.
+
+    Args:
+        structure_dict (dict): Structure dictionary as produced by Structure.as_dict().
+
+    Returns:
+        str: POSCAR file contents.
+    """
+    matrix = structure_dict["lattice"]["matrix"]
+    sites = structure_dict["sites"]
+
+    symbols = []
+    for site in sites:
+        species = site["species"]
+        if len(species) != 1 or species[0].get("occu", 1) != 1:
+            raise ValueError("Disordered structure with partial occupancies cannot be converted into POSCAR")
+        properties = site.get("properties") or {}
+        for name in _POSCAR_SITE_PROPERTIES:
+            if properties.get(name) is not None:
+                raise ValueError(f"Site property '{name}' is not supported by the fast formatter; use --validate")
+        symbols.append(species[0]["element"])
+
+    if all("abc" in site for site in sites):
+        coords_key, coords_mode = "abc", "direct"
+    else:
+        coords_key, coords_mode = "xyz", "cartesian"
+
+    # Consecutive sites of the same species form one block in the POSCAR
+    groups = [(symbol, len(list(block))) for symbol, block in itertools.groupby(symbols)]
 
+    lines = [" ".join(f"{symbol}{count}" for symbol, count in groups), "1.0"]
+    lines.extend(_POSCAR_ROW.format(*vector) for vector in matrix)
+    lines.append(" ".join(symbol for symbol, _ in groups))
+    lines.append(" ".join(str(count) for _, count in groups))
+    lines.append(coords_mode)
+    lines.extend(f"{_POSCAR_ROW.format(*site[coords_key])} {symbol}" for site, symbol in zip(sites, symbols))
+    return "\n".join(lines) + "\n"
+
+# Characters other than alphanumerics, '_' and '-' (\w follows str.isalnum())
+_INVALID_FILENAME_CHARS = re.compile(r"[^\w-]")
+
+@lru_cache(maxsize=4096)
 def sanitize_filename(name):
     """
     Sanitizes the filename by removing or replacing invalid characters.
@@ -98,75 +333,182 @@ def sanitize_filename(name):
     Returns:
         str: Sanitized filename.
     """
-    return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name)
+    return _INVALID_FILENAME_CHARS.sub('_', name)
+
+# pymatgen Structure class, imported by _worker_init only when validating
+_Structure = None
+
+def _worker_init(validate, log_level):
+    """
+    Initializes a worker process: sets up logging and, with --validate,
+    imports pymatgen once so every task in the worker reuses it.
+
+    Args:
+        validate (bool): Whether the worker reconstructs structures with pymatgen.
+        log_level (int): Logging level of the main process.
+    """
+    global _Structure
+    logging.basicConfig(level=log_level, format="%(message)s")
+    if validate:
+        from pymatgen.core import Structure as _Structure
+
+def make_executor(workers, validate, log_level):
+    """
+    Creates the worker pool. Where available, workers are started from a
+    forkserver that has pymatgen preloaded when validating, so it is
+    imported once and shared copy-on-write instead of once per worker.
+
+    Args:
+        workers (int): Number of worker processes.
+        validate (bool): Whether the workers reconstruct structures with pymatgen.
+        log_level (int): Logging level of the main process.
+
+    Returns:
+        ProcessPoolExecutor: The worker pool.
+    """
+    context = None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        if validate:
+            context.set_forkserver_preload(["pymatgen.core"])
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_worker_init,
+        initargs=(validate, log_level),
+    )
+
+def _format_poscar(task, validate=False):
+    """
+    Worker function: formats the POSCAR text for a single structure.
+    Writing is left to the main process.
+
+    Args:
+        task (tuple): (structure_dict, poscar_path) pair.
+        validate (bool): Reconstruct the Structure with pymatgen and use its writer.
+
+    Returns:
+        tuple: (poscar_path, text) pair, or None if the structure could not be formatted.
+    """
+    structure_dict, poscar_path = task
+    if not validate:
+        try:
+            return poscar_path, _poscar_from_dict(structure_dict)
+        except Exception as e:
+            logger.error("Error formatting POSCAR file '%s': %s", poscar_path, e)
+            return None
+
+    try:
+        # Reconstruct the Structure object
+        structure = _Structure.from_dict(structure_dict)
+        return poscar_path, structure.to(fmt="poscar")
+    except Exception as e:
+        logger.error("Error reconstructing Structure for '%s': %s", poscar_path, e)
+        return None
+
+def iter_tasks(data, file_path, output_dir, filename_prefix):
+    """
+    Yields one (structure_dict, poscar_path) task per step that has a structure.
+
+    Args:
+        data (dict): Parsed JSON data of one input file.
+        file_path (str): Path of the JSON file, used in the POSCAR filenames.
+        output_dir (str): Directory to save the POSCAR files.
+        filename_prefix (str): Prefix for the POSCAR filenames.
+
+    Yields:
+        tuple: (structure_dict, poscar_path) pair.
+    """
+    base_filename = os.path.basename(file_path)
+    sanitized_base_filename = sanitize_filename(os.path.splitext(base_filename)[0])
+
+    # Iterate over the top-level keys in the JSON data
+    for top_key in data:
+        logger.debug("Processing top-level key: '%s'", top_key)
+        entries = data[top_key]
+        if not entries:
+            logger.debug("No entries found under key '%s'. Skipping.", top_key)
+            continue
+
+        sanitized_top_key = sanitize_filename(top_key) or "key_empty"
+
+        for entry_index, entry in enumerate(entries):
+            # Each entry is a dictionary with keys like "ENAUG", "ENMAX", etc.
+            steps = entry.get('steps', [])
+            if not steps:
+                logger.debug("No 'steps' found in entry %s under key '%s'. Skipping.", entry_index, top_key)
+                continue
+
+            for step_index, step in enumerate(steps):
+                structure_dict = step.get('structure')
+                if not structure_dict:
+                    logger.debug("No 'structure' found in step %s of entry %s under key '%s'. Skipping.", step_index, entry_index, top_key)
+                    continue
+
+                # Generate POSCAR filename
+                poscar_filename = f"{filename_prefix}{sanitized_base_filename}_{sanitized_top_key}_entry{entry_index}_step{step_index}.vasp"
+
+                # Full path for the POSCAR file
+                poscar_path = os.path.join(output_dir, poscar_filename)
+                yield structure_dict, poscar_path
 
 def main():
     # Parse command-line arguments
     args = parse_arguments()
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(message)s")
+
+    if args.archive == "zst" and zstandard is None:
+        logger.error("--archive zst requires the 'zstandard' package.")
+        sys.exit(1)
+    if args.validate and importlib.util.find_spec("pymatgen") is None:
+        logger.error("--validate requires the 'pymatgen' package.")
+        sys.exit(1)
+    if args.workers is not None and args.workers < 0:
+        logger.error("--workers must be positive, or 0 to use all CPUs.")
+        sys.exit(1)
     input_dir = args.input
     output_dir = args.output
     filename_prefix = args.filename_prefix
+    workers = args.workers or os.cpu_count() or 1
 
     # Create output directory
     create_output_directory(output_dir)
 
     # Iterate over input directory
-    pattern = os.path.join(input_dir, "*.json")
-    json_files = sorted(glob.glob(pattern))
+    json_files = list_json_files(input_dir)
 
     if not json_files:
-        print(f"No JSON files found in directory '{input_dir}'.")
+        logger.error("No JSON files found in directory '%s'.", input_dir)
         sys.exit(1)
 
-    for file_index, file_path in enumerate(json_files):
-        print(f"\nProcessing file {file_index}: '{file_path}'")
-
-        # Load JSON data
-        data = load_json(file_path)
-        if data is None:
-            continue  # Skip this file if loading failed
-
-        # Iterate over the top-level keys in the JSON data
-        for top_key in data:
-            print(f"Processing top-level key: '{top_key}'")
-            entries = data[top_key]
-            if not entries:
-                print(f"No entries found under key '{top_key}'. Skipping.")
-                continue
-
-            for entry_index, entry in enumerate(entries):
-                # Each entry is a dictionary with keys like "ENAUG", "ENMAX", etc.
-                steps = entry.get('steps', [])
-                if not steps:
-                    print(f"No 'steps' found in entry {entry_index} under key '{top_key}'. Skipping.")
-                    continue
-
-                for step_index, step in enumerate(steps):
-                    structure_dict = step.get('structure')
-                    if not structure_dict:
-                        print(f"No 'structure' found in step {step_index} of entry {entry_index} under key '{top_key}'. Skipping.")
-                        continue
-
-                    try:
-                        # Reconstruct the Structure object
-                        structure = Structure.from_dict(structure_dict)
-                    except Exception as e:
-                        print(f"Error reconstructing Structure for step {step_index} of entry {entry_index} under key '{top_key}': {e}")
-                        continue
+    # Formatting POSCAR text is independent per step, so it is spread over a
+    # pool of worker processes; this process is the single writer
+    logger.info("Writing POSCAR files with %s workers.", workers)
+    format_poscar = partial(_format_poscar, validate=args.validate)
+    with make_executor(workers, args.validate, log_level) as executor, \
+            open_poscar_writer(output_dir, args.archive, args.shard_size) as write:
+        for file_index, file_path in enumerate(json_files):
+            logger.info("Processing file %s: '%s'", file_index, file_path)
 
-                    # Generate POSCAR filename
-                    sanitized_top_key = sanitize_filename(top_key) or "key_empty"
-                    base_filename = os.path.basename(file_path)
-                    sanitized_base_filename = sanitize_filename(os.path.splitext(base_filename)[0])
-                    poscar_filename = f"{filename_prefix}{sanitized_base_filename}_{sanitized_top_key}_entry{entry_index}_step{step_index}.vasp"
+            # Load JSON data
+            data = load_json(file_path)
+            if data is None:
+                continue  # Skip this file if loading failed
 
-                    # Full path for the POSCAR file
-                    poscar_path = os.path.join(output_dir, poscar_filename)
+            # Dispatch this file's steps before loading the next file
+            tasks = iter_tasks(data, file_path, output_dir, filename_prefix)
+            processed = 0
+            for result in executor.map(format_poscar, tasks, chunksize=64):
+                processed += 1
+                if result is not None:
+                    write(*result)
 
-                    # Generate the POSCAR file
-                    generate_poscar(structure, poscar_path)
+            # Release the parsed file before the next one is loaded
+            del data, tasks
+            logger.info("Processed %s structures from the JSON file.", processed)
 
-    print("\nAll POSCAR files have been generated.")
+    logger.info("All POSCAR files have been generated.")
 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,20 @@
 import json
-import csv
 import os
+import re
 import argparse
+import logging
 from pymatgen.core import Structure
-import glob
+from functools import lru_cache
 import sys
 
+logger = logging.getLogger(__name__)
+
+# Optional faster JSON backends
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def parse_arguments():
     """
     Parses command-line arguments.
@@ -30,11 +39,19 @@ def parse_arguments():
         default=".",
         help="Directory to save the generated id_prop.csv file. Defaults to '.'",
     )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Log per-entry progress and skipped entries.",
+    )
     return parser.parse_args()
 
 def load_json(file_path):
     """
-    Loads JSON data from a file.
+    Loads JSON data from a file. orjson is used when available; it rejects
+    the NaN/Infinity literals that json.dump writes by default, so files it
+    cannot parse are reparsed with the json module.
 
     Args:
         file_path (str): Path to the JSON file.
@@ -43,14 +60,45 @@ def load_json(file_path):
         dict: Parsed JSON data.
     """
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        print(f"Successfully loaded JSON data from '{file_path}'.")
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        if orjson is not None:
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                data = json.loads(raw)
+        else:
+            data = json.loads(raw)
+        logger.info("Successfully loaded JSON data from '%s'.", file_path)
         return data
     except Exception as e:
-        print(f"Error loading JSON file '{file_path}': {e}")
+        logger.error("Error loading JSON file '%s': %s", file_path, e)
         return None  # Return None instead of exiting
 
+def list_json_files(directory):
+    """
+    Lists the JSON files in a directory, sorted by path. Uses os.scandir so
+    names come straight from the directory listing, without glob matching.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        list: Paths of the JSON files, or an empty list if the directory does not exist.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return sorted(
+                entry.path for entry in it
+                if entry.name.endswith(".json") and not entry.name.startswith(".")
+            )
+    except FileNotFoundError:
+        return []
+
+# Characters other than alphanumerics, '_' and '-' (\w follows str.isalnum())
+_INVALID_FILENAME_CHARS = re.compile(r"[^\w-]")
+
+@lru_cache(maxsize=4096)
 def sanitize_filename(name):
     """
     Sanitizes the filename by removing or replacing invalid characters.
@@ -61,11 +109,31 @@ def sanitize_filename(name):
     Returns:
         str: Sanitized filename.
     """
-    return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name)
+    return _INVALID_FILENAME_CHARS.sub('_', name)
+
+# Number of rows buffered in memory between writes to id_prop.csv
+_ROWS_PER_WRITE = 4096
+
+def write_rows(csvfile, rows):
+    """
+    Writes buffered (filename, value) rows to the CSV file in one call and
+    clears the buffer. Filenames are already sanitized, so no CSV quoting
+    is needed.
+
+    Args:
+        csvfile (file): Open id_prop.csv file.
+        rows (list): Buffered (filename, value) pairs.
+    """
+    csvfile.write("".join(f"{name},{value}\n" for name, value in rows))
+    rows.clear()
 
 def main():
     # Parse command-line arguments
     args = parse_arguments()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(message)s",
+    )
     input_dir = args.input
     output_dir = args.output
 
@@ -76,20 +144,19 @@ def main():
     id_prop_path = os.path.join(output_dir, "id_prop.csv")
 
     # Open the CSV file for writing
-    with open(id_prop_path, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
+    with open(id_prop_path, 'w', buffering=1 << 20, newline='') as csvfile:
+        rows = []
 
         skipped = 0
         # Iterate over input directory
-        pattern = os.path.join(input_dir, "*.json")
-        json_files = sorted(glob.glob(pattern))
+        json_files = list_json_files(input_dir)
 
         if not json_files:
-            print(f"No JSON files found in directory '{input_dir}'.")
+            logger.error("No JSON files found in directory '%s'.", input_dir)
             sys.exit(1)
 
         for file_index, file_path in enumerate(json_files):
-            print(f"\nProcessing file {file_index}: '{file_path}'")
+            logger.info("Processing file %s: '%s'", file_index, file_path)
 
             # Load JSON data
             data = load_json(file_path)
@@ -101,10 +168,10 @@ def main():
 
             # Iterate over the top-level keys in the JSON data
             for top_key in data:
-                print(f"Processing top-level key: '{top_key}'")
+                logger.debug("Processing top-level key: '%s'", top_key)
                 entries = data[top_key]
                 if not entries:
-                    print(f"No entries found under key '{top_key}'. Skipping.")
+                    logger.debug("No entries found under key '%s'. Skipping.", top_key)
                     continue
 
                 sanitized_top_key = sanitize_filename(top_key) or "key_empty"
@@ -113,7 +180,7 @@ def main():
                     # Each entry is a dictionary with keys like "ENAUG", "ENMAX", etc.
                     steps = entry.get('steps', [])
                     if not steps:
-                        print(f"No 'steps' found in entry {entry_index} under key '{top_key}'. Skipping.")
+                        logger.debug("No 'steps' found in entry %s under key '%s'. Skipping.", entry_index, top_key)
                         continue
 
                     for step_index, step in enumerate(steps):
@@ -121,23 +188,20 @@ def main():
                         energy = step.get('energy')
 
                         if not structure_dict or energy is None:
-                            print(f"Missing 'structure' or 'energy' in step {step_index} of entry {entry_index} under key '{top_key}'. Skipping.")
+                            logger.debug("Missing 'structure' or 'energy' in step %s of entry %s under key '%s'. Skipping.", step_index, entry_index, top_key)
                             skipped += 1
                             continue
 
                         # Generate POSCAR filename consistent with makePOSCARs.py
                         poscar_filename = f"POSCAR_{sanitized_base_filename}_{sanitized_top_key}_entry{entry_index}_step{step_index}.vasp"
 
-                        # Write to the id_prop.csv file
-                        try:
-                            writer.writerow([poscar_filename, energy])
-                            #print(f"Written to id_prop.csv: {poscar_filename}, {energy}")
-                        except Exception as e:
-                            print(f"Error writing to id_prop.csv for {poscar_filename}: {e}")
-                            skipped += 1
-                            continue
+                        # Buffer the row and write to the id_prop.csv file in batches
+                        rows.append((poscar_filename, energy))
+                        if len(rows) >= _ROWS_PER_WRITE:
+                            write_rows(csvfile, rows)
 
-        print(f"\nAll data has been processed. Number of entries skipped: {skipped}")
+        write_rows(csvfile, rows)
+        logger.info("All data has been processed. Number of entries skipped: %s", skipped)
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,35 @@
 import json
 import os
+import re
 import argparse
-from pymatgen.core import Structure
-from pymatgen.core.structure import Structure
-from pymatgen.core.lattice import Lattice
-import glob
+import logging
+import multiprocessing
+import importlib.util
+import io
+import tarfile
+import time
+import itertools
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Optional faster JSON backends
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Optional zstd compression for --archive zst
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 def parse_arguments():
     """
@@ -37,11 +62,45 @@ def parse_arguments():
         default="POSCAR_",
         help="Prefix for the POSCAR filenames. Defaults to 'POSCAR_'.",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--validate",
+        "--safe",
+        dest="validate",
+        action="store_true",
+        help="Reconstruct and validate each Structure with pymatgen and use its POSCAR writer instead of the fast formatter.",
+    )
+    parser.add_argument(
+        "--archive",
+        choices=sorted(_ARCHIVE_FORMATS),
+        default=None,
+        help="Bundle the POSCAR files into sharded tar archives (uncompressed, gzip or zstd) instead of writing one file per structure.",
+    )
+    parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=10000,
+        help="Number of POSCAR files per archive when --archive is used. Defaults to 10000.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Log per-entry progress and skipped entries.",
+    )
     return parser.parse_args()
 
 def load_json(file_path):
     """
-    Loads JSON data from a file.
+    Loads JSON data from a file. orjson is used when available; it rejects
+    the NaN/Infinity literals that json.dump writes by default, so files it
+    cannot parse are reparsed with the json module.
 
     Args:
         file_path (str): Path to the JSON file.
@@ -50,14 +109,75 @@ def load_json(file_path):
         dict: Parsed JSON data.
     """
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        print(f"Successfully loaded JSON data from '{file_path}'.")
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        if orjson is not None:
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                data = json.loads(raw)
+        else:
+            data = json.loads(raw)
+        logger.info("Successfully loaded JSON data from '%s'.", file_path)
         return data
     except Exception as e:
-        print(f"Error loading JSON file '{file_path}': {e}")
+        logger.error("Error loading JSON file '%s': %s", file_path, e)
+        exit(1)
+
+def iter_entries(file_path):
+    """
+    Yields the items of the top-level 'entries' list of a JSON file.
+
+    When ijson is available the entries are streamed one at a time, so the
+    full list is never held in memory. Otherwise the whole file is loaded
+    with load_json. ijson rejects the NaN/Infinity literals that json.dump
+    writes by default; if it fails partway, the file is loaded with
+    load_json and the remaining entries are yielded from there.
+
+    Args:
+        file_path (str): Path to the JSON file.
+
+    Yields:
+        dict: One entry at a time.
+    """
+    if ijson is None:
+        yield from load_json(file_path).get('entries', [])
+        return
+
+    yielded = 0
+    try:
+        with open(file_path, 'rb') as f:
+            for entry in ijson.items(f, "entries.item", use_float=True):
+                yield entry
+                yielded += 1
+    except ijson.JSONError as e:
+        logger.info("Streaming '%s' failed; loading it with json instead.", file_path)
+        logger.debug("ijson error: %s", e)
+        yield from itertools.islice(load_json(file_path).get('entries', []), yielded, None)
+    except Exception as e:
+        logger.error("Error loading JSON file '%s': %s", file_path, e)
         exit(1)
 
+def list_json_files(directory):
+    """
+    Lists the JSON files in a directory, sorted by path. Uses os.scandir so
+    names come straight from the directory listing, without glob matching.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        list: Paths of the JSON files, or an empty list if the directory does not exist.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return sorted(
+                entry.path for entry in it
+                if entry.name.endswith(".json") and not entry.name.startswith(".")
+            )
+    except FileNotFoundError:
+        return []
+
 def create_output_directory(directory):
     """
     Creates the output directory if it does not exist.
@@ -68,27 +188,178 @@ def create_output_directory(directory):
     if not os.path.exists(directory):
         try:
             os.makedirs(directory)
-            print(f"Created output directory '{directory}'.")
+            logger.info("Created output directory '%s'.", directory)
         except Exception as e:
-            print(f"Error creating directory '{directory}': {e}")
+            logger.error("Error creating directory '%s': %s", directory, e)
             exit(1)
     else:
-        print(f"Output directory '{directory}' already exists.")
+        logger.info("Output directory '%s' already exists.", directory)
 
-def generate_poscar(structure, filename):
+def write_poscar(filename, text):
     """
-    Generates a POSCAR file from a pymatgen Structure object.
+    Writes POSCAR text to a file with a single buffered write.
 
     Args:
-        structure (Structure): pymatgen Structure object.
         filename (str): Path to save the POSCAR file.
+        text (str): POSCAR file contents.
     """
     try:
-        structure.to(fmt="poscar", filename=filename)
-        print(f"POSCAR file written to '{filename}'.")
+        with open(filename, "wb", buffering=1 << 20) as f:
+            f.write(text.encode())
     except Exception as e:
-        print(f"Error writing POSCAR file '{filename}': {e}")
+        logger.error("Error writing POSCAR file '%s': %s", filename, e)
+
+# Archive formats for --archive: tarfile mode and file suffix
+_ARCHIVE_FORMATS = {
+    "tar": ("w", ".tar"),
+    "gz": ("w:gz", ".tar.gz"),
+    "zst": ("w|", ".tar.zst"),
+}
+
+class PoscarArchive:
+    """
+    Writes POSCAR files as members of sharded tar archives instead of one
+    file per structure. Shards are named poscars_shardNNN.tar[.gz|.zst] and
+    hold up to shard_size members each. The member names are the POSCAR
+    filenames that id_prop.csv refers to.
+    """
+
+    def __init__(self, output_dir, compression, shard_size=10000):
+        self.output_dir = output_dir
+        self.compression = compression
+        self.shard_size = shard_size
+        self.shard_index = 0
+        self.count = 0
+        self.tar = None
+        self.stream = None
+
+    def _open_shard(self):
+        mode, suffix = _ARCHIVE_FORMATS[self.compression]
+        path = os.path.join(self.output_dir, f"poscars_shard{self.shard_index:03d}{suffix}")
+        if self.compression == "zst":
+            self.stream = zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+            self.tar = tarfile.open(fileobj=self.stream, mode=mode)
+        else:
+            self.tar = tarfile.open(path, mode=mode)
+        logger.info("Writing POSCAR archive '%s'.", path)
+
+    def _close_shard(self):
+        self.tar.close()
+        if self.stream is not None:
+            # Ends the zstd frame and closes the underlying file
+            self.stream.close()
+        self.tar = None
+        self.stream = None
+        self.count = 0
+        self.shard_index += 1
+
+    def write(self, filename, text):
+        """
+        Adds POSCAR text to the current shard, starting a new one when full.
+
+        Args:
+            filename (str): Path of the POSCAR file; its basename is the member name.
+            text (str): POSCAR file contents.
+        """
+        if self.tar is None:
+            self._open_shard()
+
+        data = text.encode()
+        info = tarfile.TarInfo(name=os.path.basename(filename))
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.tar.addfile(info, io.BytesIO(data))
+
+        self.count += 1
+        if self.count >= self.shard_size:
+            self._close_shard()
+
+    def close(self):
+        """Finishes the current shard, if any."""
+        if self.tar is not None:
+            self._close_shard()
+
+@contextmanager
+def open_poscar_writer(output_dir, archive=None, shard_size=10000):
+    """
+    Context manager yielding a write(filename, text) callable: write_poscar
+    for plain files, or PoscarArchive.write when writing archives.
+
+    Args:
+        output_dir (str): Directory to save the POSCAR files or archives.
+        archive (str): One of the _ARCHIVE_FORMATS keys, or None for plain files.
+        shard_size (int): Number of POSCAR files per archive.
+    """
+    if archive is None:
+        yield write_poscar
+        return
+
+    poscar_archive = PoscarArchive(output_dir, archive, shard_size)
+    try:
+        yield poscar_archive.write
+    finally:
+        poscar_archive.close()
+
+# Number format pymatgen's POSCAR writer uses for lattice and coordinate rows
+_POSCAR_ROW = "{:21.16f} {:21.16f} {:21.16f}"
+
+# Site properties that pymatgen writes into a POSCAR; the fast formatter
+# cannot emit them, so structures carrying them are rejected
+_POSCAR_SITE_PROPERTIES = ("selective_dynamics", "velocities", "predictor_corrector")
+
+def _poscar_from_dict(structure_dict):
+    """
+    Formats POSCAR text straight from a serialized pymatgen Structure,
+    without building the Structure object. Sites are written in direct
+    (fractional) coordinates with pymatgen's number format; if any site
+    lacks fractional coordinates, Cartesian ones are written instead.
+
+    The output is not identical to pymatgen's: the comment line lists the
+    species blocks in site order rather than the reduced formula, and site
+    labels are bare element symbols without oxidation states. Structures
+    with selective dynamics, velocities or predictor-corrector site
+    properties raise ValueError; use --validate for those.
+
+    Args:
+        structure_dict (dict): Structure dictionary as produced by Structure.as_dict().
+
+    Returns:
+        str: POSCAR file contents.
+    """
+    matrix = structure_dict["lattice"]["matrix"]
+    sites = structure_dict["sites"]
+
+    symbols = []
+    for site in sites:
+        species = site["species"]
+        if len(species) != 1 or species[0].get("occu", 1) != 1:
+            raise ValueError("Disordered structure with partial occupancies cannot be converted into POSCAR")
+        properties = site.get("properties") or {}
+        for name in _POSCAR_SITE_PROPERTIES:
+            if properties.get(name) is not None:
+                raise ValueError(f"Site property '{name}' is not supported by the fast formatter; use --validate")
+        symbols.append(species[0]["element"])
 
+    if all("abc" in site for site in sites):
+        coords_key, coords_mode = "abc", "direct"
+    else:
+        coords_key, coords_mode = "xyz", "cartesian"
+
+    # Consecutive sites of the same species form one block in the POSCAR
+    groups = [(symbol, len(list(block))) for symbol, block in itertools.groupby(symbols)]
+
+    lines = [" ".join(f"{symbol}{count}" for symbol, count in groups), "1.0"]
+    lines.extend(_POSCAR_ROW.format(*vector) for vector in matrix)
+    lines.append(" ".join(symbol for symbol, _ in groups))
+    lines.append(" ".join(str(count) for _, count in groups))
+    lines.append(coords_mode)
+    lines.extend(f"{_POSCAR_ROW.format(*site[coords_key])} {symbol}" for site, symbol in zip(sites, symbols))
+    return "\n".join(lines) + "\n"
+
+# Characters other than alphanumerics, '_' and '-' (\w follows str.isalnum())
+_INVALID_FILENAME_CHARS = re.compile(r"[^\w-]")
+
+@lru_cache(maxsize=4096)
 def sanitize_filename(name):
     """
     Sanitizes the filename by removing or replacing invalid characters.
@@ -99,72 +370,208 @@ def sanitize_filename(name):
     Returns:
         str: Sanitized filename.
     """
-    return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name)
+    return _INVALID_FILENAME_CHARS.sub('_', name)
+
+# pymatgen Structure class, imported by _worker_init only when validating
+_Structure = None
+
+def _worker_init(validate, log_level):
+    """
+    Initializes a worker process: sets up logging and, with --validate,
+    imports pymatgen once so every task in the worker reuses it.
+
+    Args:
+        validate (bool): Whether the worker reconstructs structures with pymatgen.
+        log_level (int): Logging level of the main process.
+    """
+    global _Structure
+    logging.basicConfig(level=log_level, format="%(message)s")
+    if validate:
+        from pymatgen.core import Structure as _Structure
+
+def make_executor(workers, validate, log_level):
+    """
+    Creates the worker pool. Where available, workers are started from a
+    forkserver that has pymatgen preloaded when validating, so it is
+    imported once and shared copy-on-write instead of once per worker.
+
+    Args:
+        workers (int): Number of worker processes.
+        validate (bool): Whether the workers reconstruct structures with pymatgen.
+        log_level (int): Logging level of the main process.
+
+    Returns:
+        ProcessPoolExecutor: The worker pool.
+    """
+    context = None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        if validate:
+            context.set_forkserver_preload(["pymatgen.core"])
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_worker_init,
+        initargs=(validate, log_level),
+    )
+
+def _format_poscar(task, validate=False):
+    """
+    Worker function: formats the POSCAR text for a single structure.
+    Writing is left to the main process.
+
+    Args:
+        task (tuple): (structure_dict, poscar_path) pair.
+        validate (bool): Reconstruct the Structure with pymatgen and use its writer.
+
+    Returns:
+        tuple: (poscar_path, text) pair, or None if the structure could not be formatted.
+    """
+    structure_dict, poscar_path = task
+    if not validate:
+        try:
+            return poscar_path, _poscar_from_dict(structure_dict)
+        except Exception as e:
+            logger.error("Error formatting POSCAR file '%s': %s", poscar_path, e)
+            return None
+
+    try:
+        # Reconstruct the Structure object using pymatgen
+        structure = _Structure.from_dict(structure_dict)
+        return poscar_path, structure.to(fmt="poscar")
+    except Exception as e:
+        logger.error("Error reconstructing Structure for '%s': %s", poscar_path, e)
+        return None
+
+def iter_tasks(entries, index, output_dir, filename_prefix):
+    """
+    Yields one (structure_dict, poscar_path) task per entry that has a structure.
+
+    Args:
+        entries (iterable): Entries of the JSON file with the given index.
+        index (int): Index of the JSON file, used in the POSCAR filenames.
+        output_dir (str): Directory to save the POSCAR files.
+        filename_prefix (str): Prefix for the POSCAR filenames.
+
+    Yields:
+        tuple: (structure_dict, poscar_path) pair.
+    """
+    for idx, entry in enumerate(entries, start=1):
+        # Extract the structure dictionary
+        structure_dict = entry.get('structure')
+        if not structure_dict:
+            logger.debug("Entry %s does not contain a 'structure' key. Skipping.", idx)
+            continue
+
+        # Determine a unique identifier for the POSCAR filename
+        # Prefer 'mat_id' if available, else use the entry index
+        mat_id = entry.get('data', {}).get('mat_id', f'entry_{idx}')
+        if not mat_id:
+            mat_id = f'entry_{idx}'
+        sanitized_mat_id = sanitize_filename(mat_id)
+        poscar_filename = f"{filename_prefix}_jsonNum_{index}_entryNum{idx}_{sanitized_mat_id}.vasp"
+
+        # Full path for the POSCAR file
+        poscar_path = os.path.join(output_dir, poscar_filename)
+        yield structure_dict, poscar_path
+
+def _run_chunk(fn, chunk):
+    """
+    Worker function: applies fn to every item of a chunk.
+
+    Args:
+        fn (callable): Function to apply.
+        chunk (list): Items to process.
+
+    Returns:
+        list: Results in chunk order.
+    """
+    return [fn(item) for item in chunk]
+
+def bounded_map(executor, fn, iterable, max_workers, chunksize=64):
+    """
+    Like executor.map, but pulls items from iterable lazily and keeps at most
+    2 * max_workers chunks of chunksize items in flight, so memory stays
+    bounded regardless of the input size. Results are yielded as chunks
+    complete, so their order is not preserved.
+
+    Args:
+        executor (Executor): Executor to submit the chunks to.
+        fn (callable): Picklable function applied to each item.
+        iterable (iterable): Items to process.
+        max_workers (int): Number of workers of the executor.
+        chunksize (int): Number of items sent to a worker at once.
+
+    Yields:
+        Result of fn for each item.
+    """
+    iterator = iter(iterable)
+    pending = set()
+    while True:
+        while len(pending) < 2 * max_workers:
+            chunk = list(itertools.islice(iterator, chunksize))
+            if not chunk:
+                break
+            pending.add(executor.submit(_run_chunk, fn, chunk))
+
+        if not pending:
+            return
+
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from future.result()
 
 def main():
     # Parse command-line arguments
     args = parse_arguments()
+    log_level = logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=log_level, format="%(message)s")
+
+    if args.archive == "zst" and zstandard is None:
+        logger.error("--archive zst requires the 'zstandard' package.")
+        exit(1)
+    if args.validate and importlib.util.find_spec("pymatgen") is None:
+        logger.error("--validate requires the 'pymatgen' package.")
+        exit(1)
+    if args.workers is not None and args.workers < 0:
+        logger.error("--workers must be positive, or 0 to use all CPUs.")
+        exit(1)
     input_dir = args.input
     output_dir = args.output
     filename_prefix = args.filename_prefix 
+    workers = args.workers or os.cpu_count() or 1
+    format_poscar = partial(_format_poscar, validate=args.validate)
 
-    # Iterate over input directory
-    pattern = os.path.join(input_dir, "*.json")
-    for index, file_path in enumerate(sorted(glob.glob(pattern))):
-        
-        print(f"Processing file {index}: {file_path}")
+    # Formatting POSCAR text is independent per entry, so it is spread over
+    # a pool of worker processes
+    with make_executor(workers, args.validate, log_level) as executor, \
+            open_poscar_writer(output_dir, args.archive, args.shard_size) as write:
+        # Iterate over input directory
+        for index, file_path in enumerate(list_json_files(input_dir)):
 
-        # Make text file for each json to see the speed it progresses
-        with open(f"completed{index}.txt", "w") as file:
-            pass
+            logger.info("Processing file %s: %s", index, file_path)
 
-        # Load JSON data
-        data = load_json(file_path)
+            # Create output directory
+            create_output_directory(output_dir)
 
-        # Create output directory
-        create_output_directory(output_dir)
-
-        # Extract entries
-        entries = data.get('entries', [])
-        if not entries:
-            print("No 'entries' found in the JSON file.")
-            exit(1)
+            # Stream entries from the JSON file
+            entries = iter_entries(file_path)
+            first_entry = next(entries, None)
+            if first_entry is None:
+                logger.error("No 'entries' found in the JSON file.")
+                exit(1)
 
-        print(f"Found {len(entries)} entries in the JSON file.")
+            # Format POSCAR text in the workers, feeding them tasks as they free
+            # up, and write the files from this process as results come back
+            tasks = iter_tasks(itertools.chain([first_entry], entries), index, output_dir, filename_prefix)
+            processed = 0
+            for result in bounded_map(executor, format_poscar, tasks, workers):
+                processed += 1
+                if result is not None:
+                    write(*result)
 
-        # Iterate over entries and generate POSCAR files
-        for idx, entry in enumerate(entries, start=1):
-            print(f"\nProcessing entry {idx}/{len(entries)}...")
-
-            # Extract the structure dictionary
-            structure_dict = entry.get('structure')
-            if not structure_dict:
-                print(f"Entry {idx} does not contain a 'structure' key. Skipping.")
-                continue
-
-            try:
-                # Reconstruct the Structure object using pymatgen
-                structure = Structure.from_dict(structure_dict)
-            except Exception as e:
-                    print(f"Error reconstructing Structure for entry {idx}: {e}")
-                    continue
-
-            # Determine a unique identifier for the POSCAR filename
-            # Prefer 'mat_id' if available, else use the entry index
-            mat_id = entry.get('data', {}).get('mat_id', f'entry_{idx}')
-            if not mat_id:
-                mat_id = f'entry_{idx}'
-            sanitized_mat_id = sanitize_filename(mat_id)
-            poscar_filename = f"{filename_prefix}_jsonNum_{index}_entryNum{idx}_{sanitized_mat_id}.vasp"
-            print(poscar_filename)
-
-            # Full path for the POSCAR file
-            poscar_path = os.path.join(output_dir, poscar_filename)
-
-            # Generate the POSCAR file
-            generate_poscar(structure, poscar_path)
-            
-        print("\nAll POSCAR files have been generated.")
+            logger.info("Processed %s structures from the JSON file.", processed)
+            logger.info("All POSCAR files have been generated.")
 
 if __name__ == "__main__":
     main()
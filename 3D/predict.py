@@ -3,6 +3,7 @@ import transformers
 import torch
 import os
 import zipfile
+from functools import lru_cache
 from jarvis.io.vasp.inputs import Poscar
 from pydantic_settings import BaseSettings
 from typing import Optional
@@ -32,46 +33,172 @@ class TrainingPropConfig(BaseSettings):
     keep_data_order: bool = True
     desc_type: str = "desc_2"  # Added this line
     convert: bool = False
+    compile_model: bool = False
 
-# Load the configuration file
-config_file_path = "config.json"
-with open(config_file_path, "r") as f:
-    config_data = json.load(f)
-
-config = TrainingPropConfig(**config_data)
-print(config)
-
-# Let's load the model first
-model_name = config.model_name
-output_dir = config.output_dir
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-if "t5" in model_name:
-    model = transformers.T5ForConditionalGeneration.from_pretrained(
-        model_name
+CONFIG_FILE = "config.json"
+# Copy of best_model.pt with the DataParallel prefix stripped, saved in a
+# format that torch.load can memory-map on later runs
+CACHED_WEIGHTS = "best_model.mmap.pt"
+
+def load_config(config_file_path=CONFIG_FILE):
+    """Loads the configuration file."""
+    with open(config_file_path, "r") as f:
+        config_data = json.load(f)
+    return TrainingPropConfig(**config_data)
+
+def _load_state_dict(output_dir):
+    """
+    Loads the fine-tuned weights from output_dir.
+
+    The first run strips the DataParallel 'module.' prefix from
+    best_model.pt and saves the result as CACHED_WEIGHTS; later runs
+    memory-map that copy instead of deserializing the full checkpoint.
+    """
+    checkpoint_path = os.path.join(output_dir, "best_model.pt")
+    cache_path = os.path.join(output_dir, CACHED_WEIGHTS)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(checkpoint_path):
+        return torch.load(cache_path, map_location="cpu", mmap=True, weights_only=True)
+
+    # Handle the DataParallel prefix in the state_dict
+    state_dict = torch.load(checkpoint_path, map_location="cpu")
+    # Remove 'module.' prefix from the keys in place, without a second dict
+    for k in list(state_dict.keys()):
+        if k.startswith("module."):
+            state_dict[k[len("module."):]] = state_dict.pop(k)
+    try:
+        torch.save(state_dict, cache_path, _use_new_zipfile_serialization=True)
+    except OSError as e:
+        print(f"Could not cache weights to '{cache_path}': {e}")
+    return state_dict
+
+def load_model(config_file_path=CONFIG_FILE):
+    """
+    Returns the config, fine-tuned model and tokenizer, loading them once
+    per process. The path is normalised first so that every spelling of
+    the same config file shares one cache entry.
+
+    Returns:
+        tuple: (config, model, tokenizer, device)
+    """
+    return _load_model(os.path.abspath(config_file_path))
+
+@lru_cache(maxsize=1)
+def _load_model(config_file_path):
+    """
+    Loads the config, fine-tuned model and tokenizer. Cached; call
+    load_model instead.
+
+    Returns:
+        tuple: (config, model, tokenizer, device)
+    """
+    config = load_config(config_file_path)
+    print(config)
+
+    # Let's load the model first
+    model_name = config.model_name
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if "t5" in model_name:
+        model = transformers.T5ForConditionalGeneration.from_pretrained(
+            model_name
+        )
+    else:
+        model = transformers.AutoModelForCausalLM.from_pretrained(
+            model_name,
+            low_cpu_mem_usage=True,
+        )
+
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+    if tokenizer.pad_token is None:
+        tokenizer.add_special_tokens({"pad_token": "[PAD]"})
+
+    # Size the input embedding from the fine-tuned checkpoint, which already
+    # carries the resized embedding, and only resize when the pretrained
+    # model's row count differs from it
+    state_dict = _load_state_dict(config.output_dir)
+    embedding = model.get_input_embeddings()
+    embedding_key = next(
+        name for name, param in model.named_parameters() if param is embedding.weight
     )
-else:
-    model = transformers.AutoModelForCausalLM.from_pretrained(
-        model_name,
-        low_cpu_mem_usage=True,
+    checkpoint_embedding = state_dict.get(embedding_key)
+    num_rows = checkpoint_embedding.shape[0] if checkpoint_embedding is not None else len(tokenizer)
+    if num_rows != embedding.num_embeddings:
+        model.resize_token_embeddings(num_rows)
+    model.lm_head = torch.nn.Sequential(
+        torch.nn.Linear(model.config.hidden_size, config.latent_dim),
+        torch.nn.Linear(config.latent_dim, 1),
     )
+    model.load_state_dict(state_dict)
+
+    # Run in half precision on GPU: bfloat16 where supported, float16 otherwise
+    if device.type == "cuda":
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    else:
+        dtype = torch.float32
+    model = model.to(device, dtype=dtype)
+    model.eval()
 
-tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
-if tokenizer.pad_token is None:
-    tokenizer.add_special_tokens({"pad_token": "[PAD]"})
-    model.resize_token_embeddings(len(tokenizer))
-model.lm_head = torch.nn.Sequential(
-    torch.nn.Linear(model.config.hidden_size, config.latent_dim),
-    torch.nn.Linear(config.latent_dim, 1),
-)
-# Handle the DataParallel prefix in the state_dict
-state_dict = torch.load(os.path.join(output_dir, "best_model.pt"), map_location=device)
-# Remove 'module.' prefix from the keys
-new_state_dict = {k.replace("module.", ""): v for k, v in state_dict.items()}
-
-model.load_state_dict(new_state_dict)
-
-# Get description
-pos = """Mo2S4
+    # Inputs are always padded to max_length, so the forward pass has a single
+    # shape; compiling it lets repeated predictions replay CUDA graphs
+    if config.compile_model and device.type == "cuda":
+        model = torch.compile(model, mode="reduce-overhead")
+    return config, model, tokenizer, device
+
+def predict(pos, config_file_path=CONFIG_FILE):
+    """
+    Predicts the property of a structure.
+
+    Args:
+        pos (str): Structure in POSCAR format.
+        config_file_path (str): Path to the configuration file.
+
+    Returns:
+        float: Predicted property.
+    """
+    config, model, tokenizer, device = load_model(config_file_path)
+    dtype = next(model.parameters()).dtype
+
+    # The regression head averages the logits over every position, pad tokens
+    # included, so inputs must be padded to the same length used in training
+    max_length = config.max_length
+    input_ids = tokenizer(
+        [pos],
+        return_tensors="pt",
+        max_length=max_length,
+        padding="max_length",
+        truncation=True,
+    )['input_ids']
+
+    input_ids=input_ids.to(device)
+
+    with torch.inference_mode(), torch.autocast(
+        device_type=device.type, dtype=dtype, enabled=device.type == "cuda"
+    ):
+        if "t5" in config.model_name:
+            predictions = (
+                model(
+                    input_ids,
+                    decoder_input_ids=input_ids,
+                )
+                .logits.squeeze()
+                .mean(dim=-1)
+            )
+        else:
+            predictions = (
+                model(
+                    input_ids,
+                )
+                .logits.squeeze()
+                .mean(dim=-1)
+            )
+
+    # NumPy has no bfloat16, so cast back to float32 before converting
+    return predictions.float().cpu().numpy().tolist()
+
+if __name__ == "__main__":
+    config = load_model()[0]
+
+    # Get description
+    pos = """Mo2S4
 1.0
 1.5957990235943282 -2.764004284915705 0.0
 1.5957990235946695 2.7640042849149173 0.0
@@ -87,46 +214,15 @@ Cartesian
 1.5958 -0.9213351759999822 10.92587443043865
 """
 
-atoms = Poscar.from_string(pos).atoms
-print("Inputted POSCAR:")
-print(atoms)
-desc = atoms.describe()[config.desc_type]
-desc = atoms.describe()['desc_2']
-
-#print(desc)
-
-# Predict property
-max_length=512
-input_ids = tokenizer(
-    [pos],
-    return_tensors="pt",
-    max_length=max_length,
-    padding="max_length",
-    truncation=True,
-)['input_ids']
-
-
-input_ids=input_ids.to(device)
-model=model.to(device)
-
-if "t5" in model_name:
-    predictions = (
-        model(
-            input_ids,
-            decoder_input_ids=input_ids,
-        )
-        .logits.squeeze()
-        .mean(dim=-1)
-    )
-else:
-    predictions = (
-        model(
-            input_ids.to(device),
-        )
-        .logits.squeeze()
-        .mean(dim=-1)
-    )
+    atoms = Poscar.from_string(pos).atoms
+    print("Inputted POSCAR:")
+    print(atoms)
+    description = atoms.describe()
+    desc = description.get(config.desc_type, description['desc_2'])
+
+    #print(desc)
 
-predictions = predictions.cpu().detach().numpy().tolist()
-print("Predicted bandgap energy:")
-print(predictions)
+    # Predict property
+    predictions = predict(pos)
+    print("Predicted bandgap energy:")
+    print(predictions)
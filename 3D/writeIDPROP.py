@@ -1,11 +1,26 @@
 import json
-import csv
 import os
+import re
 import argparse
+import logging
+import itertools
+import numpy as np
 from pymatgen.core import Structure
 from pymatgen.core.structure import Structure
 from pymatgen.core.lattice import Lattice
-import glob
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Optional faster JSON backends
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 def parse_arguments():
     """
@@ -38,11 +53,19 @@ def parse_arguments():
         default="POSCAR_",
         help="Prefix for the POSCAR filenames. Defaults to 'POSCAR_'.",
     )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Log per-entry progress and skipped entries.",
+    )
     return parser.parse_args()
 
 def load_json(file_path):
     """
-    Loads JSON data from a file.
+    Loads JSON data from a file. orjson is used when available; it rejects
+    the NaN/Infinity literals that json.dump writes by default, so files it
+    cannot parse are reparsed with the json module.
 
     Args:
         file_path (str): Path to the JSON file.
@@ -51,14 +74,75 @@ def load_json(file_path):
         dict: Parsed JSON data.
     """
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        print(f"Successfully loaded JSON data from '{file_path}'.")
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        if orjson is not None:
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                data = json.loads(raw)
+        else:
+            data = json.loads(raw)
+        logger.info("Successfully loaded JSON data from '%s'.", file_path)
         return data
     except Exception as e:
-        print(f"Error loading JSON file '{file_path}': {e}")
+        logger.error("Error loading JSON file '%s': %s", file_path, e)
+        exit(1)
+
+def iter_entries(file_path):
+    """
+    Yields the items of the top-level 'entries' list of a JSON file.
+
+    When ijson is available the entries are streamed one at a time, so the
+    full list is never held in memory. Otherwise the whole file is loaded
+    with load_json. ijson rejects the NaN/Infinity literals that json.dump
+    writes by default; if it fails partway, the file is loaded with
+    load_json and the remaining entries are yielded from there.
+
+    Args:
+        file_path (str): Path to the JSON file.
+
+    Yields:
+        dict: One entry at a time.
+    """
+    if ijson is None:
+        yield from load_json(file_path).get('entries', [])
+        return
+
+    yielded = 0
+    try:
+        with open(file_path, 'rb') as f:
+            for entry in ijson.items(f, "entries.item", use_float=True):
+                yield entry
+                yielded += 1
+    except ijson.JSONError as e:
+        logger.info("Streaming '%s' failed; loading it with json instead.", file_path)
+        logger.debug("ijson error: %s", e)
+        yield from itertools.islice(load_json(file_path).get('entries', []), yielded, None)
+    except Exception as e:
+        logger.error("Error loading JSON file '%s': %s", file_path, e)
         exit(1)
 
+def list_json_files(directory):
+    """
+    Lists the JSON files in a directory, sorted by path. Uses os.scandir so
+    names come straight from the directory listing, without glob matching.
+
+    Args:
+        directory (str): Path to the directory.
+
+    Returns:
+        list: Paths of the JSON files, or an empty list if the directory does not exist.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return sorted(
+                entry.path for entry in it
+                if entry.name.endswith(".json") and not entry.name.startswith(".")
+            )
+    except FileNotFoundError:
+        return []
+
 def create_output_directory(directory):
     """
     Creates the output directory if it does not exist.
@@ -69,12 +153,12 @@ def create_output_directory(directory):
     if not os.path.exists(directory):
         try:
             os.makedirs(directory)
-            print(f"Created output directory '{directory}'.")
+            logger.info("Created output directory '%s'.", directory)
         except Exception as e:
-            print(f"Error creating directory '{directory}': {e}")
+            logger.error("Error creating directory '%s': %s", directory, e)
             exit(1)
     else:
-        print(f"Output directory '{directory}' already exists.")
+        logger.info("Output directory '%s' already exists.", directory)
 
 def generate_poscar(structure, filename):
     """
@@ -86,10 +170,14 @@ def generate_poscar(structure, filename):
     """
     try:
         structure.to(fmt="poscar", filename=filename)
-        print(f"POSCAR file written to '{filename}'.")
+        logger.debug("POSCAR file written to '%s'.", filename)
     except Exception as e:
-        print(f"Error writing POSCAR file '{filename}': {e}")
+        logger.error("Error writing POSCAR file '%s': %s", filename, e)
+
+# Characters other than alphanumerics, '_' and '-' (\w follows str.isalnum())
+_INVALID_FILENAME_CHARS = re.compile(r"[^\w-]")
 
+@lru_cache(maxsize=4096)
 def sanitize_filename(name):
     """
     Sanitizes the filename by removing or replacing invalid characters.
@@ -100,44 +188,61 @@ def sanitize_filename(name):
     Returns:
         str: Sanitized filename.
     """
-    return "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in name)
+    return _INVALID_FILENAME_CHARS.sub('_', name)
+
+# Number of rows buffered in memory between writes to id_prop.csv
+_ROWS_PER_WRITE = 4096
+
+def write_rows(csvfile, names, gaps):
+    """
+    Writes buffered rows to the CSV file in one call and clears the buffers.
+    The smaller of the direct and indirect band gaps is computed for the
+    whole batch at once. Filenames are already sanitized, so no CSV quoting
+    is needed.
+
+    Args:
+        csvfile (file): Open id_prop.csv file.
+        names (list): Buffered POSCAR filenames.
+        gaps (list): Buffered (direct, indirect) band gap pairs.
+    """
+    if not names:
+        return
+
+    gaps_arr = np.asarray(gaps, dtype=float)
+    direct, indirect = gaps_arr[:, 0], gaps_arr[:, 1]
+    # Same as min(direct, indirect): the indirect gap only wins when it
+    # compares smaller, so a NaN indirect gap keeps the direct one
+    best = np.where(indirect < direct, indirect, direct)
+    csvfile.write("".join(f"{name},{gap}\n" for name, gap in zip(names, best.tolist())))
+    names.clear()
+    gaps.clear()
 
 def main():
     # Parse command-line arguments
     args = parse_arguments()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(message)s",
+    )
     input_dir = args.input
     output_dir = args.output
     filename_prefix = args.filename_prefix 
 
     # Open the CSV file for writing
-    with open("./id_prop.csv", 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
+    with open("./id_prop.csv", 'w', buffering=1 << 20, newline='') as csvfile:
+        names = []
+        gaps = []
 
         skipped = 0
         # Iterate over input directory
-        pattern = os.path.join(input_dir, "*.json")
-        for index, file_path in enumerate(sorted(glob.glob(pattern))):
+        for index, file_path in enumerate(list_json_files(input_dir)):
             
-            print(f"Processing file {index}: {file_path}")
+            logger.info("Processing file %s: %s", index, file_path)
 
-            # Make text file for each json to see the speed it progresses
-            with open(f"completed{index}.txt", "w") as file:
-                pass
-
-            # Load JSON data
-            data = load_json(file_path)
-
-            # Extract entries
-            entries = data.get('entries', [])
-            if not entries:
-                print("No 'entries' found in the JSON file.")
-                exit(1)
-
-            print(f"Found {len(entries)} entries in the JSON file.")
-
-            # Iterate over entries and write to id_prop.csv
-            for idx, entry in enumerate(entries, start=1):
-                print(f"\nProcessing entry {idx}/{len(entries)}...")
+            # Stream entries from the JSON file and write to id_prop.csv
+            idx = 0
+            for idx, entry in enumerate(iter_entries(file_path), start=1):
+                logger.debug("Processing entry %s...", idx)
 
                 # Determine the unique identifier for the POSCAR filename
                 # Prefer 'mat_id' if available, else use the entry index
@@ -146,7 +251,7 @@ def main():
                     mat_id = f'entry_{idx}'
                 sanitized_mat_id = sanitize_filename(mat_id)
                 poscar_filename = f"{filename_prefix}_jsonNum_{index}_entryNum{idx}_{sanitized_mat_id}.vasp"
-                print(poscar_filename)
+                logger.debug("%s", poscar_filename)
 
                 # Write to the id_prop.csv file...
                 try:
@@ -154,15 +259,26 @@ def main():
                     material_id = poscar_filename
                     direct_bandgap = entry['data']['band_gap_dir']
                     indirect_bandgap = entry['data']['band_gap_ind']
-                    # Write the extracted data to the CSV file
-                    writer.writerow([material_id, min(direct_bandgap, indirect_bandgap)])
+                    # Buffer the row and write to the CSV file in batches
+                    gaps.append((float(direct_bandgap), float(indirect_bandgap)))
+                    names.append(material_id)
                 except KeyError as e:
-                    print(f"Missing key {e} in entry, skipping.")
+                    logger.debug("Missing key %s in entry, skipping.", e)
                     skipped = skipped + 1
-                
-    # Make a text file that corresponds to the number of entries skipped
-    with open(f"skipped{skipped}entries.txt", "w") as file:
-        pass
+                    continue
+
+                if len(names) >= _ROWS_PER_WRITE:
+                    write_rows(csvfile, names, gaps)
+            write_rows(csvfile, names, gaps)
+
+            if idx == 0:
+                logger.error("No 'entries' found in the JSON file.")
+                exit(1)
+
+            logger.info("Processed %s entries from the JSON file.", idx)
+
+    # Report the number of entries skipped
+    logger.info("skipped=%s", skipped)
 
 if __name__ == "__main__":
     main()